@@ -0,0 +1,65 @@
+"""
+Optional compiled BM25 scoring kernel.
+
+When numba is installed the term-at-a-time accumulation of AsyncFastCodeSearchIndex
+runs in a single JIT-compiled loop per query term, writing into a dense score vector.
+Without numba the engine keeps using its pure Python loop.
+"""
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _accumulate_postings(doc_ids, tfs, doc_lengths, doc_len_norm, scores, bm25_weight, tfidf_weight):
+        for p in range(doc_ids.shape[0]):
+            doc_id = doc_ids[p]
+            tf = tfs[p]
+            scores[doc_id] += (
+                bm25_weight * tf / (tf + doc_len_norm[doc_id])
+                + tfidf_weight * tf / doc_lengths[doc_id]
+            )
+
+def score_top_k(
+    postings: Sequence[Tuple[Sequence[int], Sequence[int], float, float]],
+    doc_lengths: Sequence[int],
+    doc_len_norm: Sequence[float],
+    top_k: int
+) -> List[Tuple[int, float]]:
+    """
+    Accumulate scores for (doc_ids, tfs, bm25_weight, tfidf_weight) postings of each
+    query term and return the top-k (doc_id, score) pairs, best first.
+    doc_len_norm holds the precomputed BM25 length normalisation per doc id.
+    Posting and length buffers are wrapped without copying. Requires numba.
+    """
+    if top_k <= 0:
+        return []
+
+    lengths = np.frombuffer(doc_lengths, dtype=np.int32)
+    norms = np.frombuffer(doc_len_norm, dtype=np.float64)
+    scores = np.zeros(lengths.shape[0], dtype=np.float64)
+
+    for doc_ids, tfs, bm25_weight, tfidf_weight in postings:
+        _accumulate_postings(
+            np.frombuffer(doc_ids, dtype=np.int32),
+            np.frombuffer(tfs, dtype=np.int32),
+            lengths,
+            norms,
+            scores,
+            bm25_weight,
+            tfidf_weight
+        )
+
+    # Every matching posting adds a positive contribution, so non-zero marks a hit
+    hits = np.flatnonzero(scores)
+    if hits.shape[0] > top_k:
+        hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+    hits = hits[np.argsort(-scores[hits], kind='stable')]
+    return [(int(doc_id), float(scores[doc_id])) for doc_id in hits]
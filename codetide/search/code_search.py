@@ -3,7 +3,9 @@ from codetide.search.engine import AsyncFastCodeSearchIndex
 
 from typing import Dict, List, Tuple, Optional
 from collections import defaultdict
+from operator import itemgetter
 import asyncio
+import heapq
 
 class SmartCodeSearch:
     """
@@ -150,13 +152,13 @@ class SmartCodeSearch:
                 combined_scores[doc_key] += score * exact_match_boost
                 result_counts[doc_key] += 1
         
-        # Normalize scores by appearance frequency and sort
-        final_scores = [
+        # Normalize scores by appearance frequency and keep only the top-k
+        final_scores = (
             (doc_key, score / result_counts[doc_key])
             for doc_key, score in combined_scores.items()
-        ]
+        )
         
-        return sorted(final_scores, key=lambda x: x[1], reverse=True)[:top_k]
+        return heapq.nlargest(top_k, final_scores, key=itemgetter(1))
     
     async def search_with_context(self, 
                                  query: str, 
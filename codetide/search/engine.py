@@ -1,11 +1,116 @@
 import pickle
 import asyncio
+from array import array
 from collections import defaultdict, Counter
+import bisect
+import heapq
 import math
+import mmap
+import os
 import re
+import struct
+import sys
+import weakref
 from typing import Dict, List, Tuple, Set, Optional
 from concurrent.futures import ThreadPoolExecutor
 from codetide.core.logs import logger
+from codetide.search import bm25
+import orjson
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_TOKEN_RE = re.compile(r'\w+')
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase and split text into word tokens, interned so equal terms share one string object"""
+    return list(map(sys.intern, _TOKEN_RE.findall(text.lower())))
+
+def _count_terms(text: str, term_doc_freq: Optional[Dict[str, int]] = None) -> Tuple[Dict[str, int], int]:
+    """
+    Count terms of a document in a single pass over its tokens, returning (term_counts, doc_length).
+    When term_doc_freq is given, it is incremented once for every distinct term of the document.
+    """
+    term_counts = {}
+    doc_length = 0
+    for match in _TOKEN_RE.finditer(text.lower()):
+        term = match.group()
+        count = term_counts.get(term)
+        if count is None:
+            term = sys.intern(term)
+            term_counts[term] = 1
+            if term_doc_freq is not None:
+                term_doc_freq[term] += 1
+        else:
+            term_counts[term] = count + 1
+        doc_length += 1
+    return term_counts, doc_length
+
+def _shutdown_executor(executor: ThreadPoolExecutor):
+    """Finalizer fallback for indexes that were never closed explicitly"""
+    executor.shutdown(wait=False)
+
+# Below these sizes offloading to the executor costs more than running inline
+_INLINE_WORK_THRESHOLD = 5000
+_MIN_ITEMS_PER_CHUNK = 64
+
+# On-disk index layout: magic, metadata length, orjson metadata, then flat 8-byte aligned arrays
+_INDEX_MAGIC = b'CTSIDX01'
+_INDEX_HEADER = struct.Struct('<8sQ')
+_INDEX_ALIGNMENT = 8
+
+def _padding(size: int) -> int:
+    return -size % _INDEX_ALIGNMENT
+
+def _write_index_file(filepath: str, meta: Dict, sections: List[Tuple[str, array]]):
+    """
+    Write metadata and flat arrays so they can later be memory-mapped without copying.
+    The file is written aside and then swapped in, so live mappings of a previous
+    version of the index are never truncated underneath their readers.
+    """
+    meta['sections'] = [[name, values.typecode, len(values)] for name, values in sections]
+    meta_bytes = orjson.dumps(meta)
+    
+    tmp_path = f'{filepath}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(b'\0' * _padding(_INDEX_HEADER.size + len(meta_bytes)))
+        for _, values in sections:
+            f.write(values.tobytes())
+            f.write(b'\0' * _padding(len(values) * values.itemsize))
+    os.replace(tmp_path, filepath)
+
+def _read_index_file(filepath: str) -> Optional[Tuple[Dict, Dict[str, memoryview]]]:
+    """
+    Memory-map an index file written by _write_index_file, returning (meta, arrays).
+    Arrays are zero-copy views over the mapping. Returns None for legacy pickle files.
+    """
+    with open(filepath, 'rb') as f:
+        header = f.read(_INDEX_HEADER.size)
+        if len(header) < _INDEX_HEADER.size or not header.startswith(_INDEX_MAGIC):
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    _, meta_length = _INDEX_HEADER.unpack(header)
+    buffer = memoryview(mapped)
+    offset = _INDEX_HEADER.size + meta_length
+    meta = orjson.loads(buffer[_INDEX_HEADER.size:offset])
+    offset += _padding(offset)
+    
+    arrays = {}
+    for name, typecode, length in meta['sections']:
+        nbytes = length * array(typecode).itemsize
+        view = buffer[offset:offset + nbytes].cast(typecode)
+        if meta['byteorder'] != sys.byteorder:
+            # Foreign byte order, fall back to a swapped in-memory copy
+            view = array(typecode, view.tobytes())
+            view.byteswap()
+        arrays[name] = view
+        offset += nbytes + _padding(nbytes)
+    return meta, arrays
 
 class AsyncFastCodeSearchIndex:
     def __init__(self, documents: Dict[str, str], max_workers: Optional[int] = None):
@@ -17,30 +122,74 @@ class AsyncFastCodeSearchIndex:
         self.doc_keys = list(documents.keys())
         self.N = len(documents)
         self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._executor = None
         
         # Will be set during index building
         self.index_ready = False
     
-    async def build_index_async(self):
-        """Build index asynchronously with parallel processing"""
-        logger.info(f"Building search index async with {self.max_workers or 'default'} workers...")
-        
-        # Split documents into chunks for parallel processing
-        chunk_size = max(1, len(self.documents) // (self.max_workers or 4))
-        doc_items = list(self.documents.items())
-        chunks = [doc_items[i:i + chunk_size] for i in range(0, len(doc_items), chunk_size)]
-        
-        # Process chunks in parallel
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool, only created once some work is actually offloaded"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._executor_finalizer = weakref.finalize(self, _shutdown_executor, self._executor)
+        return self._executor
+    
+    def close(self):
+        """Shut down the executor, waiting for running work and cancelling queued work"""
+        executor = getattr(self, '_executor', None)
+        if executor is None:
+            return
+        self._executor = None
+        self._executor_finalizer.detach()
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    async def aclose(self):
+        """Async variant of close() that waits for the executor off the event loop"""
+        await asyncio.to_thread(self.close)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+    
+    async def _run(self, work_size: int, func, *args):
+        """Run func in the executor, or inline when the work is too small to be worth a thread hop"""
+        if self.max_workers == 1 or work_size < _INLINE_WORK_THRESHOLD:
+            return func(*args)
         loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    async def _map_chunks(self, func, items: List, *args) -> List:
+        """
+        Split items into one chunk per worker and apply func to each chunk in parallel.
+        Small inputs are processed inline as a single chunk.
+        """
+        workers = self.max_workers or 4
+        if self.max_workers == 1 or len(items) < workers * _MIN_ITEMS_PER_CHUNK:
+            return [func(items, *args)]
         
-        # Tokenize and count terms in parallel
-        tokenize_tasks = [
-            loop.run_in_executor(self.executor, self._process_chunk, chunk)
-            for chunk in chunks
+        chunk_size = max(1, len(items) // workers)
+        loop = asyncio.get_event_loop()
+        tasks = [
+            loop.run_in_executor(self.executor, func, items[i:i + chunk_size], *args)
+            for i in range(0, len(items), chunk_size)
         ]
+        return await asyncio.gather(*tasks)
+    
+    async def build_index_async(self):
+        """Build index asynchronously with parallel processing"""
+        logger.info(f"Building search index async with {self.max_workers or 'default'} workers...")
         
-        chunk_results = await asyncio.gather(*tokenize_tasks)
+        # Tokenize and count terms in parallel chunks
+        chunk_results = await self._map_chunks(self._process_chunk, list(self.documents.items()))
         
         # Merge results from all chunks
         await self._merge_chunk_results(chunk_results)
@@ -50,90 +199,55 @@ class AsyncFastCodeSearchIndex:
     
     def _process_chunk(self, chunk: List[Tuple[str, str]]) -> Dict:
         """Process a chunk of documents (runs in thread)"""
-        if not hasattr(self, '_token_pattern'):
-            self._token_pattern = re.compile(r'\b\w+\b')
-        
-        chunk_data = {
-            'tokenized_docs': {},
-            'doc_lengths': {},
-            'doc_term_counts': {},
-            'term_doc_freq': defaultdict(int),
-            'all_terms': set()
-        }
+        doc_lengths = {}
+        doc_term_counts = {}
+        term_doc_freq = defaultdict(int)
         
         for doc_key, content in chunk:
-            tokens = self._token_pattern.findall(content.lower())
-            term_counts = Counter(tokens)
-            
-            chunk_data['tokenized_docs'][doc_key] = tokens
-            chunk_data['doc_lengths'][doc_key] = len(tokens)
-            chunk_data['doc_term_counts'][doc_key] = term_counts
-            
-            unique_terms = term_counts.keys()
-            chunk_data['all_terms'].update(unique_terms)
-            for term in unique_terms:
-                chunk_data['term_doc_freq'][term] += 1
+            doc_term_counts[doc_key], doc_lengths[doc_key] = _count_terms(content, term_doc_freq)
         
-        return chunk_data
+        return {
+            'doc_lengths': doc_lengths,
+            'doc_term_counts': doc_term_counts,
+            'term_doc_freq': term_doc_freq
+        }
     
     async def _merge_chunk_results(self, chunk_results: List[Dict]):
         """Merge results from parallel chunk processing"""
         # Initialize combined data structures
-        self.tokenized_docs = {}
         self.doc_lengths = {}
         self.doc_term_counts = {}
         term_doc_freq = defaultdict(int)
-        all_terms = set()
         
         # Merge all chunks
         for chunk_data in chunk_results:
-            self.tokenized_docs.update(chunk_data['tokenized_docs'])
             self.doc_lengths.update(chunk_data['doc_lengths'])
             self.doc_term_counts.update(chunk_data['doc_term_counts'])
-            all_terms.update(chunk_data['all_terms'])
             
             for term, freq in chunk_data['term_doc_freq'].items():
                 term_doc_freq[term] += freq
         
         # Compute IDF scores
-        loop = asyncio.get_event_loop()
-        self.idf_scores = await loop.run_in_executor(
-            self.executor, 
-            self._compute_idf_scores, 
-            all_terms, 
+        self.idf_scores = await self._run(
+            len(term_doc_freq),
+            self._compute_idf_scores,
+            set(term_doc_freq),
             term_doc_freq
         )
         
-        # Compute TF scores in parallel
-        tf_tasks = []
-        chunk_size = max(1, len(self.doc_keys) // (self.max_workers or 4))
-        for i in range(0, len(self.doc_keys), chunk_size):
-            doc_chunk = self.doc_keys[i:i + chunk_size]
-            tf_tasks.append(
-                loop.run_in_executor(
-                    self.executor,
-                    self._compute_tf_scores_chunk,
-                    doc_chunk
-                )
-            )
-        
-        tf_results = await asyncio.gather(*tf_tasks)
-        
-        # Merge TF scores
-        self.tf_scores = {}
-        for tf_chunk in tf_results:
-            self.tf_scores.update(tf_chunk)
-        
         # BM25 parameters
         self.k1 = 1.5
         self.b = 0.75
         self.avg_doc_length = sum(self.doc_lengths.values()) / self.N
         
         # Build inverted index
-        self.inverted_index = await loop.run_in_executor(
-            self.executor,
-            self._build_inverted_index
-        )
+        self.inverted_index = await self._run(self.N, self._build_inverted_index)
+        self._refresh_doc_len_norms()
+        
+        # Lowercased contents for exact matching, computed once per document
+        self._documents_lower = {
+            doc_key: content.lower() for doc_key, content in self.documents.items()
+        }
     
     def _compute_idf_scores(self, all_terms: Set[str], term_doc_freq: Dict[str, int]) -> Dict[str, float]:
         """Compute IDF scores (runs in thread)"""
@@ -142,94 +256,137 @@ class AsyncFastCodeSearchIndex:
             for term, freq in term_doc_freq.items()
         }
     
-    def _compute_tf_scores_chunk(self, doc_keys: List[str]) -> Dict[str, Dict[str, float]]:
-        """Compute TF scores for a chunk of documents"""
-        tf_scores = {}
-        for doc_key in doc_keys:
-            term_counts = self.doc_term_counts[doc_key]
-            doc_length = self.doc_lengths[doc_key]
-            tf_scores[doc_key] = {
-                term: count / doc_length 
-                for term, count in term_counts.items()
-            }
-        return tf_scores
-    
     def _build_inverted_index(self) -> defaultdict:
-        """Build inverted index (runs in thread)"""
-        inverted_index = defaultdict(set)
-        for doc_key, tokens in self.tokenized_docs.items():
-            for term in set(tokens):
-                inverted_index[term].add(doc_key)
+        """
+        Build inverted index (runs in thread).
+        Documents are assigned integer ids in order, so each posting list is a
+        sorted array of doc ids. The matching term frequencies are stored in
+        posting_tfs, aligned position by position with the postings.
+        """
+        self.doc_id_of = {}
+        self._doc_key_by_id = []
+        self._doc_length_by_id = array('i')
+        inverted_index = defaultdict(self._new_postings)
+        posting_tfs = defaultdict(self._new_postings)
+        for doc_key, term_counts in self.doc_term_counts.items():
+            doc_id = self._assign_doc_id(doc_key)
+            for term, count in term_counts.items():
+                inverted_index[term].append(doc_id)
+                posting_tfs[term].append(count)
+        self.posting_tfs = posting_tfs
         return inverted_index
     
+    @staticmethod
+    def _new_postings() -> array:
+        return array('i')
+    
+    def _assign_doc_id(self, doc_key: str) -> int:
+        """Assign the next integer id to a document, ids are never reused"""
+        doc_id = len(self._doc_key_by_id)
+        self._doc_key_by_id.append(doc_key)
+        self._doc_length_by_id.append(self.doc_lengths[doc_key])
+        self.doc_id_of[doc_key] = doc_id
+        return doc_id
+    
     def _process_single_document(self, doc_key: str, content: str) -> Dict:
         """Process a single document for updating (runs in thread)"""
-        if not hasattr(self, '_token_pattern'):
-            self._token_pattern = re.compile(r'\b\w+\b')
-        
-        tokens = self._token_pattern.findall(content.lower())
-        term_counts = Counter(tokens)
-        doc_length = len(tokens)
+        term_counts, doc_length = _count_terms(content)
         
         return {
             'doc_key': doc_key,
-            'tokens': tokens,
             'term_counts': term_counts,
             'doc_length': doc_length,
             'unique_terms': set(term_counts.keys())
         }
     
-    async def _remove_document_from_index(self, doc_key: str):
-        """Remove document data from all indexes"""
-        if doc_key not in self.doc_keys:
+    def _process_documents_chunk(self, chunk: List[Tuple[str, str]]) -> List[Dict]:
+        """Process a chunk of documents for updating (runs in thread)"""
+        return [self._process_single_document(doc_key, content) for doc_key, content in chunk]
+    
+    async def _remove_document_from_index(self, doc_key: str, defer_stats: bool = False):
+        """
+        Remove document data from all indexes.
+        With defer_stats the average document length is left for the caller to refresh.
+        """
+        doc_id = self.doc_id_of.pop(doc_key, None)
+        if doc_id is None:
             return
         
-        # Get old document terms for cleanup
-        old_terms = set(self.doc_term_counts.get(doc_key, {}).keys())
+        # Leave a tombstone so the ids of other documents stay valid
+        self._doc_key_by_id[doc_id] = None
         
         # Remove from inverted index
-        for term in old_terms:
-            if term in self.inverted_index:
-                self.inverted_index[term].discard(doc_key)
-                if not self.inverted_index[term]:  # Remove empty sets
-                    del self.inverted_index[term]
+        for term in self.doc_term_counts.get(doc_key, {}):
+            postings = self.inverted_index.get(term)
+            if postings is None:
+                continue
+            
+            pos = bisect.bisect_left(postings, doc_id)
+            if pos < len(postings) and postings[pos] == doc_id:
+                del postings[pos]
+                del self.posting_tfs[term][pos]
+            if not postings:  # Remove empty postings
+                del self.inverted_index[term]
+                del self.posting_tfs[term]
         
         # Remove from all document-specific indexes
-        self.tokenized_docs.pop(doc_key, None)
         self.doc_lengths.pop(doc_key, None)
         self.doc_term_counts.pop(doc_key, None)
-        self.tf_scores.pop(doc_key, None)
+        self._documents_lower.pop(doc_key, None)
         
         # Remove from document keys and update count
-        if doc_key in self.doc_keys:
-            self.doc_keys.remove(doc_key)
-            self.N -= 1
+        self.doc_keys.remove(doc_key)
+        self.N -= 1
         
-        # Recalculate average document length
+        if not defer_stats:
+            self._update_avg_doc_length()
+    
+    def _update_avg_doc_length(self):
+        """Recalculate average document length and the length normalisations depending on it"""
         if self.N > 0:
             self.avg_doc_length = sum(self.doc_lengths.values()) / self.N
         else:
             self.avg_doc_length = 0
+        self._refresh_doc_len_norms()
+    
+    def _length_norm_constants(self) -> Tuple[float, float]:
+        """BM25 length normalisation is k1 * (1 - b) + k1 * b / avg_doc_length * doc_length"""
+        k1_one_minus_b = self.k1 * (1 - self.b)
+        k1_b_over_adl = self.k1 * self.b / self.avg_doc_length if self.avg_doc_length else 0.0
+        return k1_one_minus_b, k1_b_over_adl
+    
+    def _refresh_doc_len_norms(self):
+        """Precompute the BM25 length normalisation term for every doc id"""
+        k1_one_minus_b, k1_b_over_adl = self._length_norm_constants()
+        self._doc_len_norm = array('d', (
+            k1_one_minus_b + k1_b_over_adl * doc_length for doc_length in self._doc_length_by_id
+        ))
     
-    async def _integrate_document_data(self, doc_data: Dict, is_update: bool):
-        """Integrate new document data into indexes"""
+    async def _integrate_document_data(self, doc_data: Dict, is_update: bool, defer_stats: bool = False):
+        """
+        Integrate new document data into indexes.
+        With defer_stats the IDF scores of new terms and the average document length
+        are left for the caller to refresh once a whole batch has been integrated.
+        """
         doc_key = doc_data['doc_key']
-        tokens = doc_data['tokens']
         term_counts = doc_data['term_counts']
         doc_length = doc_data['doc_length']
         unique_terms = doc_data['unique_terms']
         
         # Update document-specific data
-        self.tokenized_docs[doc_key] = tokens
         self.doc_lengths[doc_key] = doc_length
         self.doc_term_counts[doc_key] = term_counts
-        self.tf_scores[doc_key] = {
-            term: count / doc_length for term, count in term_counts.items()
-        }
         
-        # Update inverted index
-        for term in unique_terms:
-            self.inverted_index[term].add(doc_key)
+        # Update inverted index, new ids are always the largest so postings stay sorted
+        doc_id = self._assign_doc_id(doc_key)
+        k1_one_minus_b, k1_b_over_adl = self._length_norm_constants()
+        self._doc_len_norm.append(k1_one_minus_b + k1_b_over_adl * doc_length)
+        for term, count in term_counts.items():
+            self.inverted_index[term].append(doc_id)
+            self.posting_tfs[term].append(count)
+        
+        if defer_stats:
+            return
         
         # Update IDF scores for new terms
         for term in unique_terms:
@@ -238,11 +395,7 @@ class AsyncFastCodeSearchIndex:
                 doc_freq = len(self.inverted_index[term])
                 self.idf_scores[term] = math.log(self.N / doc_freq)
         
-        # Recalculate average document length
-        self.avg_doc_length = sum(self.doc_lengths.values()) / self.N
-        
-        # For efficiency, we could recalculate IDF scores for all terms periodically
-        # rather than on every update, but this keeps things simple and correct
+        self._update_avg_doc_length()
     
     async def update_document_async(self, doc_key: str, new_content: str):
         """
@@ -253,20 +406,6 @@ class AsyncFastCodeSearchIndex:
         
         logger.info(f"Updating document: {doc_key}")
         
-        # Check if this is an update or insert
-        is_update = doc_key in self.doc_keys
-        
-        # Remove old document data if updating
-        if is_update:
-            await self._remove_document_from_index(doc_key)
-        else:
-            # Add to document list for new documents
-            self.doc_keys.append(doc_key)
-            self.N += 1
-        
-        # Update documents dict
-        self.documents[doc_key] = new_content
-        
         # Process new content
         loop = asyncio.get_event_loop()
         doc_data = await loop.run_in_executor(
@@ -276,11 +415,33 @@ class AsyncFastCodeSearchIndex:
             new_content
         )
         
-        # Update indexes with new data
-        await self._integrate_document_data(doc_data, is_update)
+        is_update = await self._apply_document_data(doc_key, new_content, doc_data)
         
         logger.info(f"Document {'updated' if is_update else 'added'}: {doc_key}")
     
+    async def _apply_document_data(self, doc_key: str, new_content: str, doc_data: Dict, defer_stats: bool = False) -> bool:
+        """Replace or insert a processed document in the indexes, returns whether it was an update"""
+        self._ensure_mutable()
+        
+        # Check if this is an update or insert
+        is_update = doc_key in self.doc_id_of
+        
+        # Remove old document data if updating
+        if is_update:
+            await self._remove_document_from_index(doc_key, defer_stats=defer_stats)
+        
+        # Add to document list
+        self.doc_keys.append(doc_key)
+        self.N += 1
+        
+        # Update documents dict
+        self.documents[doc_key] = new_content
+        self._documents_lower[doc_key] = new_content.lower()
+        
+        # Update indexes with new data
+        await self._integrate_document_data(doc_data, is_update, defer_stats=defer_stats)
+        return is_update
+    
     async def batch_update_documents_async(self, updates: Dict[str, str]):
         """Update multiple documents concurrently"""
         if not self.index_ready:
@@ -288,13 +449,18 @@ class AsyncFastCodeSearchIndex:
         
         logger.info(f"Batch updating {len(updates)} documents...")
         
-        # Process all updates concurrently
-        update_tasks = [
-            self.update_document_async(doc_key, content)
-            for doc_key, content in updates.items()
-        ]
+        # Tokenize all documents in parallel chunks
+        update_items = list(updates.items())
+        chunk_results = await self._map_chunks(self._process_documents_chunk, update_items)
+        docs_data = [doc_data for chunk_data in chunk_results for doc_data in chunk_data]
+        
+        # Apply changes serially and refresh shared statistics once for the whole batch
+        for (doc_key, content), doc_data in zip(update_items, docs_data):
+            await self._apply_document_data(doc_key, content, doc_data, defer_stats=True)
+        
+        self._update_avg_doc_length()
+        await self.incremental_rebuild_async()
         
-        await asyncio.gather(*update_tasks)
         logger.info(f"Batch update completed for {len(updates)} documents")
     
     async def remove_document_async(self, doc_key: str):
@@ -302,11 +468,12 @@ class AsyncFastCodeSearchIndex:
         if not self.index_ready:
             raise RuntimeError("Index not ready. Call build_index_async() first.")
         
-        if doc_key not in self.doc_keys:
+        if doc_key not in self.doc_id_of:
             logger.warning(f"Document {doc_key} not found in index")
             return
         
         logger.info(f"Removing document: {doc_key}")
+        self._ensure_mutable()
         
         # Remove from documents dict
         self.documents.pop(doc_key, None)
@@ -327,17 +494,15 @@ class AsyncFastCodeSearchIndex:
         # In a more sophisticated implementation, we could track term frequency changes
         # and only recalculate when changes exceed the similarity threshold
         
-        loop = asyncio.get_event_loop()
-        
         # Recalculate term document frequencies
         term_doc_freq = defaultdict(int)
-        for term, doc_set in self.inverted_index.items():
-            term_doc_freq[term] = len(doc_set)
+        for term, postings in self.inverted_index.items():
+            term_doc_freq[term] = len(postings)
         
         # Recalculate IDF scores
         all_terms = set(self.idf_scores.keys())
-        self.idf_scores = await loop.run_in_executor(
-            self.executor,
+        self.idf_scores = await self._run(
+            len(term_doc_freq),
             self._compute_idf_scores,
             all_terms,
             term_doc_freq
@@ -350,9 +515,10 @@ class AsyncFastCodeSearchIndex:
         if not self.index_ready:
             raise RuntimeError("Index not ready. Call build_index_async() first.")
         
-        if doc_key not in self.doc_keys:
+        if doc_key not in self.doc_id_of:
             return {'error': f'Document {doc_key} not found'}
         
+        self._ensure_mutable()
         term_counts = self.doc_term_counts[doc_key]
         doc_length = self.doc_lengths[doc_key]
         
@@ -360,125 +526,75 @@ class AsyncFastCodeSearchIndex:
             'document_key': doc_key,
             'document_length': doc_length,
             'unique_terms': len(term_counts),
-            'most_frequent_terms': term_counts.most_common(10),
-            'tf_idf_top_terms': sorted([
-                (term, self.tf_scores[doc_key][term] * self.idf_scores.get(term, 0))
-                for term in term_counts.keys()
-            ], key=lambda x: x[1], reverse=True)[:10]
+            'most_frequent_terms': heapq.nlargest(10, term_counts.items(), key=lambda x: x[1]),
+            'tf_idf_top_terms': heapq.nlargest(10, (
+                (term, count / doc_length * self.idf_scores.get(term, 0))
+                for term, count in term_counts.items()
+            ), key=lambda x: x[1])
         }
     
     async def search_async(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
         """
-        Async search with concurrent scoring of candidate documents
+        Async search scoring documents term-at-a-time over the inverted index
         """
         if not self.index_ready:
             raise RuntimeError("Index not ready. Call build_index_async() first.")
         
         # Tokenize query
-        if not hasattr(self, '_token_pattern'):
-            self._token_pattern = re.compile(r'\b\w+\b')
-        
-        query_terms = self._token_pattern.findall(query.lower())
+        query_terms = _tokenize(query)
         if not query_terms:
             return []
         
-        # Get candidate documents using inverted index
-        candidate_docs = set()
         query_term_counts = Counter(query_terms)
         
-        for term in query_term_counts:
-            if term in self.inverted_index:
-                candidate_docs.update(self.inverted_index[term])
-        
-        if not candidate_docs:
+        # Resolve IDF once per query and drop terms that cannot contribute to any score
+        idf_scores = self.idf_scores
+        query_terms_idf = [
+            (term, query_count, idf_scores[term])
+            for term, query_count in query_term_counts.items()
+            if idf_scores.get(term, 0) > 0 and term in self.inverted_index
+        ]
+        if not query_terms_idf:
             return []
         
-        # Score candidates in parallel if we have many
-        if len(candidate_docs) > 20:  # Only parallelize if worth it
-            return await self._score_candidates_parallel(candidate_docs, query_term_counts, top_k)
-        else:
-            return await self._score_candidates_sequential(candidate_docs, query_term_counts, top_k)
+        work_size = sum(len(self.inverted_index[term]) for term, _, _ in query_terms_idf)
+        return await self._run(work_size, self._score_taat, query_terms_idf, top_k)
     
-    async def _score_candidates_parallel(self, candidate_docs: Set[str], query_term_counts: Counter, top_k: int) -> List[Tuple[str, float]]:
-        """Score candidates in parallel"""
-        loop = asyncio.get_event_loop()
-        
-        # Split candidates into chunks
-        candidates_list = list(candidate_docs)
-        chunk_size = max(1, len(candidates_list) // (self.max_workers or 4))
-        chunks = [candidates_list[i:i + chunk_size] for i in range(0, len(candidates_list), chunk_size)]
-        
-        # Score each chunk in parallel
-        scoring_tasks = [
-            loop.run_in_executor(
-                self.executor,
-                self._score_chunk,
-                chunk,
-                query_term_counts
-            )
-            for chunk in chunks
+    def _score_taat(self, query_terms_idf: List[Tuple[str, int, float]], top_k: int) -> List[Tuple[str, float]]:
+        """
+        Term-at-a-time scoring (runs in thread).
+        Walks the postings of each (term, query_count, idf) once and accumulates the
+        combined BM25 / TF-IDF contribution per doc id, then keeps the top-k.
+        Uses the compiled kernel from codetide.search.bm25 when numba is installed.
+        """
+        doc_length_by_id = self._doc_length_by_id
+        doc_len_norm = self._doc_len_norm
+        doc_key_by_id = self._doc_key_by_id
+        k1_plus_one = self.k1 + 1
+        
+        # Combined score is 0.7 * BM25 + 0.3 * TF-IDF
+        weighted_postings = [
+            (self.inverted_index[term], self.posting_tfs[term], 0.7 * idf * k1_plus_one, 0.3 * idf * query_count)
+            for term, query_count, idf in query_terms_idf
         ]
         
-        chunk_scores = await asyncio.gather(*scoring_tasks)
-        
-        # Merge all scores
-        all_scores = {}
-        for scores in chunk_scores:
-            all_scores.update(scores)
+        if bm25.NUMBA_AVAILABLE:
+            top_docs = bm25.score_top_k(weighted_postings, doc_length_by_id, doc_len_norm, top_k)
+            return [(doc_key_by_id[doc_id], score) for doc_id, score in top_docs]
         
-        # Return top-k results
-        if len(all_scores) > top_k * 3:
-            import heapq
-            return heapq.nlargest(top_k, all_scores.items(), key=lambda x: x[1])
-        else:
-            return sorted(all_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    
-    async def _score_candidates_sequential(self, candidate_docs: Set[str], query_term_counts: Counter, top_k: int) -> List[Tuple[str, float]]:
-        """Score candidates sequentially for small sets"""
-        loop = asyncio.get_event_loop()
-        scores = await loop.run_in_executor(
-            self.executor,
-            self._score_chunk,
-            list(candidate_docs),
-            query_term_counts
-        )
-        
-        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    
-    def _score_chunk(self, doc_chunk: List[str], query_term_counts: Counter) -> Dict[str, float]:
-        """Score a chunk of documents (runs in thread)"""
         scores = {}
+        for postings, tfs, bm25_weight, tfidf_weight in weighted_postings:
+            for doc_id, tf in zip(postings, tfs):
+                contribution = (
+                    bm25_weight * tf / (tf + doc_len_norm[doc_id])
+                    + tfidf_weight * tf / doc_length_by_id[doc_id]
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + contribution
         
-        for doc_key in doc_chunk:
-            doc_length = self.doc_lengths[doc_key]
-            doc_term_counts = self.doc_term_counts[doc_key]
-            
-            bm25_score = 0.0
-            tfidf_score = 0.0
-            
-            for term, query_count in query_term_counts.items():
-                idf = self.idf_scores.get(term, 0)
-                if idf == 0:
-                    continue
-                
-                tf = doc_term_counts.get(term, 0)
-                if tf == 0:
-                    continue
-                
-                # BM25 calculation
-                numerator = tf * (self.k1 + 1)
-                denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / self.avg_doc_length))
-                bm25_score += idf * (numerator / denominator)
-                
-                # TF-IDF calculation
-                tf_normalized = self.tf_scores[doc_key].get(term, 0)
-                tfidf_score += tf_normalized * idf * query_count
-            
-            # Combine scores
-            combined_score = 0.7 * bm25_score + 0.3 * tfidf_score
-            scores[doc_key] = combined_score
-        
-        return scores
+        return [
+            (doc_key_by_id[doc_id], score)
+            for doc_id, score in heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])
+        ]
     
     async def batch_search_async(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
         """
@@ -491,42 +607,86 @@ class AsyncFastCodeSearchIndex:
         """
         Async exact substring matching
         """
-        loop = asyncio.get_event_loop()
+        # Process document chunks in parallel
+        chunk_matches = await self._map_chunks(
+            self._exact_match_chunk,
+            list(self._documents_lower.items()),
+            query.lower()
+        )
         
-        # Split documents for parallel processing
-        doc_items = list(self.documents.items())
-        chunk_size = max(1, len(doc_items) // (self.max_workers or 4))
-        chunks = [doc_items[i:i + chunk_size] for i in range(0, len(doc_items), chunk_size)]
-        
-        # Process chunks in parallel
-        match_tasks = [
-            loop.run_in_executor(
-                self.executor,
-                self._exact_match_chunk,
-                chunk,
-                query.lower()
+        # Merge results and keep only the top-k
+        return heapq.nlargest(
+            top_k,
+            (match for matches in chunk_matches for match in matches),
+            key=lambda x: x[1]
+        )
+    
+    async def batch_search_exact_match_async(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        """
+        Exact substring matching for several queries at once.
+        With pyahocorasick installed, a single automaton over all queries scans each
+        document once; otherwise every query is matched separately.
+        """
+        queries_lower = [query.lower() for query in queries]
+        patterns = list(dict.fromkeys(query for query in queries_lower if query))
+        if ahocorasick is None or not patterns:
+            return await asyncio.gather(*(self.search_exact_match_async(query, top_k) for query in queries))
+        
+        automaton = ahocorasick.Automaton()
+        for pattern_id, pattern in enumerate(patterns):
+            automaton.add_word(pattern, (pattern_id, len(pattern)))
+        automaton.make_automaton()
+        
+        chunk_matches = await self._map_chunks(
+            self._exact_match_chunk_multi,
+            list(self._documents_lower.items()),
+            automaton,
+            len(patterns)
+        )
+        
+        # Collect the top-k per pattern and map them back onto the original queries
+        top_matches = [
+            heapq.nlargest(
+                top_k,
+                (match for matches in chunk_matches for match in matches[pattern_id]),
+                key=lambda x: x[1]
             )
-            for chunk in chunks
+            for pattern_id in range(len(patterns))
         ]
-        
-        chunk_matches = await asyncio.gather(*match_tasks)
-        
-        # Merge results
-        all_matches = []
-        for matches in chunk_matches:
-            all_matches.extend(matches)
-        
-        return sorted(all_matches, key=lambda x: x[1], reverse=True)[:top_k]
+        pattern_index = {pattern: pattern_id for pattern_id, pattern in enumerate(patterns)}
+        return [
+            top_matches[pattern_index[query]] if query else await self.search_exact_match_async(query, top_k)
+            for query in queries_lower
+        ]
+    
+    def _exact_match_chunk_multi(self, doc_chunk: List[Tuple[str, str]], automaton, n_patterns: int) -> List[List[Tuple[str, float]]]:
+        """
+        Process multi-pattern exact matching for a chunk of (doc_key, lowercased content) pairs.
+        Overlapping occurrences of the same pattern are skipped so counts agree with str.count.
+        """
+        matches = [[] for _ in range(n_patterns)]
+        for doc_key, content_lower in doc_chunk:
+            counts = [0] * n_patterns
+            next_start = [0] * n_patterns
+            for end_index, (pattern_id, length) in automaton.iter(content_lower):
+                start_index = end_index - length + 1
+                if start_index >= next_start[pattern_id]:
+                    counts[pattern_id] += 1
+                    next_start[pattern_id] = end_index + 1
+            
+            norm = len(content_lower) + 1
+            for pattern_id, count in enumerate(counts):
+                if count:
+                    matches[pattern_id].append((doc_key, count / norm))
+        return matches
     
     def _exact_match_chunk(self, doc_chunk: List[Tuple[str, str]], query_lower: str) -> List[Tuple[str, float]]:
-        """Process exact matching for a chunk of documents"""
+        """Process exact matching for a chunk of (doc_key, lowercased content) pairs"""
         matches = []
-        for doc_key, content in doc_chunk:
-            content_lower = content.lower()
-            if query_lower in content_lower:
-                count = content_lower.count(query_lower)
-                score = count / (len(content) + 1)
-                matches.append((doc_key, score))
+        for doc_key, content_lower in doc_chunk:
+            count = content_lower.count(query_lower)
+            if count:
+                matches.append((doc_key, count / (len(content_lower) + 1)))
         return matches
     
     async def save_index_async(self, filepath: str):
@@ -546,59 +706,145 @@ class AsyncFastCodeSearchIndex:
         logger.info("Index saved successfully")
     
     def _save_index_sync(self, filepath: str):
-        """Synchronous save operation (runs in thread)"""
-        with open(filepath, 'wb') as f:
-            pickle.dump({
-                'tokenized_docs': self.tokenized_docs,
-                'doc_lengths': self.doc_lengths,
-                'doc_term_counts': self.doc_term_counts,
-                'idf_scores': self.idf_scores,
-                'tf_scores': self.tf_scores,
+        """
+        Synchronous save operation (runs in thread).
+        Postings are written as flat CSR arrays (per-term offsets into doc ids and tfs)
+        with doc ids compacted to the doc_keys order, plus orjson metadata.
+        """
+        new_id_of = {self.doc_id_of[doc_key]: new_id for new_id, doc_key in enumerate(self.doc_keys)}
+        vocab = list(self.inverted_index.keys())
+        
+        offsets = array('q', [0])
+        doc_ids = array('i')
+        tfs = array('i')
+        idfs = array('d')
+        for term in vocab:
+            doc_ids.extend(new_id_of[doc_id] for doc_id in self.inverted_index[term])
+            tfs.extend(self.posting_tfs[term])
+            offsets.append(len(doc_ids))
+            idfs.append(self.idf_scores.get(term, 0.0))
+        
+        doc_lens = array('i', (self._doc_length_by_id[self.doc_id_of[doc_key]] for doc_key in self.doc_keys))
+        
+        _write_index_file(
+            filepath,
+            {
+                'byteorder': sys.byteorder,
                 'doc_keys': self.doc_keys,
+                'vocab': vocab,
                 'N': self.N,
                 'avg_doc_length': self.avg_doc_length,
-                'inverted_index': dict(self.inverted_index)
-            }, f)
+                'k1': self.k1,
+                'b': self.b
+            },
+            [('offsets', offsets), ('doc_ids', doc_ids), ('tfs', tfs), ('doc_lens', doc_lens), ('idfs', idfs)]
+        )
     
     @classmethod
     async def load_index_async(cls, filepath: str, documents: Dict[str, str] = None, max_workers: Optional[int] = None):
-        """Load pre-computed index from disk asynchronously"""
+        """
+        Load pre-computed index from disk asynchronously.
+        Posting arrays are memory-mapped rather than copied, per-document term counts are
+        only rebuilt once the index is modified. Legacy pickle index files are still supported.
+        """
         logger.info(f"Loading search index from {filepath}")
         
         instance = cls.__new__(cls)
         instance.max_workers = max_workers
-        instance.executor = ThreadPoolExecutor(max_workers=max_workers)
+        instance._executor = None
+        instance._mmap_backed = False
         
         loop = asyncio.get_event_loop()
-        data = await loop.run_in_executor(
+        mapped = await loop.run_in_executor(
             instance.executor,
-            instance._load_index_sync,
+            _read_index_file,
             filepath
         )
         
-        # Restore all pre-computed data
-        instance.tokenized_docs = data['tokenized_docs']
-        instance.doc_lengths = data['doc_lengths']
-        instance.doc_term_counts = data['doc_term_counts']
-        instance.idf_scores = data['idf_scores']
-        instance.tf_scores = data['tf_scores']
-        instance.doc_keys = data['doc_keys']
-        instance.N = data['N']
-        instance.avg_doc_length = data['avg_doc_length']
-        instance.inverted_index = defaultdict(set, data['inverted_index'])
-        
-        # BM25 parameters
-        instance.k1 = 1.5
-        instance.b = 0.75
+        if mapped is not None:
+            instance._restore_mapped_index(*mapped)
+        else:
+            data = await loop.run_in_executor(
+                instance.executor,
+                instance._load_index_sync,
+                filepath
+            )
+            
+            # Restore all pre-computed data
+            instance.doc_lengths = data['doc_lengths']
+            instance.doc_term_counts = data['doc_term_counts']
+            instance.idf_scores = data['idf_scores']
+            instance.doc_keys = data['doc_keys']
+            instance.N = data['N']
+            instance.avg_doc_length = data['avg_doc_length']
+            instance.inverted_index = await instance._run(instance.N, instance._build_inverted_index)
+            
+            # BM25 parameters
+            instance.k1 = 1.5
+            instance.b = 0.75
+            instance._refresh_doc_len_norms()
         
         instance.documents = documents or {}
+        instance._documents_lower = {
+            doc_key: content.lower() for doc_key, content in instance.documents.items()
+        }
         instance.index_ready = True
         
         logger.info(f"Index loaded: {instance.N} documents with {len(instance.idf_scores)} unique terms")
         return instance
     
+    def _restore_mapped_index(self, meta: Dict, arrays: Dict[str, memoryview]):
+        """Point the index structures at the memory-mapped CSR arrays"""
+        offsets = arrays['offsets']
+        doc_ids = arrays['doc_ids']
+        tfs = arrays['tfs']
+        vocab = [sys.intern(term) for term in meta['vocab']]
+        
+        self.doc_keys = meta['doc_keys']
+        self.N = meta['N']
+        self.avg_doc_length = meta['avg_doc_length']
+        self.k1 = meta['k1']
+        self.b = meta['b']
+        
+        self._doc_key_by_id = list(self.doc_keys)
+        self.doc_id_of = {doc_key: doc_id for doc_id, doc_key in enumerate(self.doc_keys)}
+        self._doc_length_by_id = arrays['doc_lens']
+        self.idf_scores = dict(zip(vocab, arrays['idfs']))
+        self.inverted_index = {}
+        self.posting_tfs = {}
+        for term_id, term in enumerate(vocab):
+            start, end = offsets[term_id], offsets[term_id + 1]
+            self.inverted_index[term] = doc_ids[start:end]
+            self.posting_tfs[term] = tfs[start:end]
+        self._refresh_doc_len_norms()
+        self._mmap_backed = True
+    
+    def _ensure_mutable(self):
+        """
+        Copy memory-mapped postings into regular arrays and rebuild the per-document
+        term counts and lengths, which modifications and document stats rely on.
+        """
+        if not getattr(self, '_mmap_backed', False):
+            return
+        
+        self.inverted_index = defaultdict(self._new_postings, {
+            term: array('i', postings) for term, postings in self.inverted_index.items()
+        })
+        self.posting_tfs = defaultdict(self._new_postings, {
+            term: array('i', tfs) for term, tfs in self.posting_tfs.items()
+        })
+        self._doc_length_by_id = array('i', self._doc_length_by_id)
+        
+        doc_key_by_id = self._doc_key_by_id
+        self.doc_lengths = dict(zip(doc_key_by_id, self._doc_length_by_id))
+        self.doc_term_counts = {doc_key: {} for doc_key in doc_key_by_id}
+        for term, postings in self.inverted_index.items():
+            for doc_id, tf in zip(postings, self.posting_tfs[term]):
+                self.doc_term_counts[doc_key_by_id[doc_id]][term] = tf
+        self._mmap_backed = False
+    
     def _load_index_sync(self, filepath: str) -> Dict:
-        """Synchronous load operation (runs in thread)"""
+        """Synchronous legacy pickle load operation (runs in thread)"""
         with open(filepath, 'rb') as f:
             return pickle.load(f)
     
@@ -614,63 +860,81 @@ class AsyncFastCodeSearchIndex:
             'max_workers': self.max_workers,
             'status': 'ready'
         }
-    
-    def __del__(self):
-        """Clean up executor"""
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=False)
 
 # Convenience wrapper for synchronous usage
 class FastCodeSearchIndex:
-    """Synchronous wrapper around AsyncFastCodeSearchIndex"""
+    """
+    Synchronous wrapper around AsyncFastCodeSearchIndex.
+    A single event loop is reused across calls, use close() or a with block to release it.
+    """
     
     def __init__(self, documents: Dict[str, str], max_workers: Optional[int] = None):
+        self._loop = asyncio.new_event_loop()
         self.async_index = AsyncFastCodeSearchIndex(documents, max_workers)
         # Build index synchronously
-        asyncio.run(self.async_index.build_index_async())
+        self._run_sync(self.async_index.build_index_async())
+    
+    def _run_sync(self, coro):
+        return self._loop.run_until_complete(coro)
     
     def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
-        return asyncio.run(self.async_index.search_async(query, top_k))
+        return self._run_sync(self.async_index.search_async(query, top_k))
     
     def batch_search(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
-        return asyncio.run(self.async_index.batch_search_async(queries, top_k))
+        return self._run_sync(self.async_index.batch_search_async(queries, top_k))
     
     def search_exact_match(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
-        return asyncio.run(self.async_index.search_exact_match_async(query, top_k))
+        return self._run_sync(self.async_index.search_exact_match_async(query, top_k))
+    
+    def batch_search_exact_match(self, queries: List[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        return self._run_sync(self.async_index.batch_search_exact_match_async(queries, top_k))
     
     def update_document(self, doc_key: str, new_content: str):
         """Update or add a single document"""
-        return asyncio.run(self.async_index.update_document_async(doc_key, new_content))
+        return self._run_sync(self.async_index.update_document_async(doc_key, new_content))
     
     def batch_update_documents(self, updates: Dict[str, str]):
         """Update multiple documents concurrently"""
-        return asyncio.run(self.async_index.batch_update_documents_async(updates))
+        return self._run_sync(self.async_index.batch_update_documents_async(updates))
     
     def remove_document(self, doc_key: str):
         """Remove a document from the index"""
-        return asyncio.run(self.async_index.remove_document_async(doc_key))
+        return self._run_sync(self.async_index.remove_document_async(doc_key))
     
     def incremental_rebuild(self, similarity_threshold: float = 0.8):
         """Smart incremental rebuild"""
-        return asyncio.run(self.async_index.incremental_rebuild_async(similarity_threshold))
+        return self._run_sync(self.async_index.incremental_rebuild_async(similarity_threshold))
     
     def get_document_stats(self, doc_key: str) -> Dict:
         """Get statistics for a specific document"""
-        return asyncio.run(self.async_index.get_document_stats(doc_key))
+        return self._run_sync(self.async_index.get_document_stats(doc_key))
     
     def save_index(self, filepath: str):
-        asyncio.run(self.async_index.save_index_async(filepath))
+        self._run_sync(self.async_index.save_index_async(filepath))
     
     @classmethod
     def load_index(cls, filepath: str, documents: Dict[str, str] = None, max_workers: Optional[int] = None):
         instance = cls.__new__(cls)
-        instance.async_index = asyncio.run(
+        instance._loop = asyncio.new_event_loop()
+        instance.async_index = instance._run_sync(
             AsyncFastCodeSearchIndex.load_index_async(filepath, documents, max_workers)
         )
         return instance
     
     def get_stats(self) -> Dict:
         return self.async_index.get_stats()
+    
+    def close(self):
+        """Shut down the index executor and close the event loop used by the wrapper"""
+        self.async_index.close()
+        if not self._loop.is_closed():
+            self._loop.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 async def main():
     """Example usage with updates"""
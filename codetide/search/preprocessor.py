@@ -1,121 +1,222 @@
 
 from functools import lru_cache
-from typing import List
+from typing import List, Tuple
 import unicodedata
 import re
 
+# Regex patterns are compiled once and shared by every preprocessor instance
+_CAMEL_CASE_RE = re.compile(r'([a-z])([A-Z])')
+_SNAKE_KEBAB_RE = re.compile(r'[_\-]+')
+_WORD_RE = re.compile(r'\w+')
+_NUMBER_RE = re.compile(r'\d+')
+
+# Simple stemming rules for common programming terms, fused into a single
+# anchored alternation; the leftmost match is always the longest suffix
+_STEM_RE = re.compile(r'(ies|ied|ying|ing|ed|er|est|s)$')
+_STEM_REPLACEMENTS = {
+    'ies': 'y',     # utilities -> utility
+    'ied': 'y',     # applied -> apply
+    'ying': 'y',    # applying -> apply
+    'ing': '',      # processing -> process
+    'ed': '',       # processed -> process
+    'er': '',       # processor -> process
+    'est': '',      # fastest -> fast
+    's': '',        # functions -> function
+}
+
+
+_CODE_EXPANSIONS = {
+    'btn': 'button',
+    'cfg': 'config configuration',
+    'ctx': 'context',
+    'db': 'database',
+    'fn': 'function',
+    'func': 'function',
+    'impl': 'implementation implement',
+    'mgr': 'manager',
+    'obj': 'object',
+    'param': 'parameter',
+    'proc': 'process processor',
+    'repo': 'repository',
+    'req': 'request require',
+    'res': 'response result',
+    'str': 'string',
+    'temp': 'temporary template',
+    'util': 'utility utilities',
+    'val': 'value',
+    'var': 'variable',
+    'auth': 'authentication authorize',
+    'admin': 'administrator administration',
+    'api': 'application programming interface',
+    'ui': 'user interface',
+    'url': 'uniform resource locator link',
+    'http': 'hypertext transfer protocol',
+    'json': 'javascript object notation',
+    'xml': 'extensible markup language',
+    'sql': 'structured query language',
+    'css': 'cascading style sheets',
+    'html': 'hypertext markup language',
+    'js': 'javascript',
+    'py': 'python',
+    'ts': 'typescript',
+    'async': 'asynchronous',
+    'sync': 'synchronous',
+}
+
+# Stop words for code (less aggressive than natural language)
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 
+    'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 
+    'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
+    'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it',
+    'we', 'they', 'me', 'him', 'her', 'us', 'them'
+})
+
+
+@lru_cache(maxsize=1000)
+def _expand_camel_case(word: str) -> str:
+    """Convert camelCase to space-separated words with caching"""
+    # A boundary needs a lowercase letter followed by an uppercase one, so
+    # single-case words are answered by str builtins without entering the regex
+    if word.islower() or word.isupper():
+        return word.lower()
+    # Handle camelCase: getUserName -> get User Name
+    expanded = _CAMEL_CASE_RE.sub(r'\1 \2', word)
+    return expanded.lower()
+
+@lru_cache(maxsize=1000)
+def _expand_snake_kebab(word: str) -> str:
+    """Convert snake_case and kebab-case to space-separated with caching"""
+    if '_' not in word and '-' not in word:
+        return word.lower()
+    # Handle snake_case and kebab-case: get_user_name -> get user name
+    return _SNAKE_KEBAB_RE.sub(' ', word).lower()
+
+@lru_cache(maxsize=500)
+def _simple_stem(word: str) -> str:
+    """Apply simple stemming rules with caching"""
+    if len(word) <= 3:  # Don't stem very short words
+        return word
+        
+    match = _STEM_RE.search(word)
+    if match is None:
+        return word
+    stemmed = word[:match.start()] + _STEM_REPLACEMENTS[match.group(1)]
+    if len(stemmed) >= 2:  # Don't create words that are too short
+        return stemmed
+    return word
+
+def _expand_abbreviations(words: List[str]) -> List[str]:
+    """Expand common code abbreviations"""
+    expanded = []
+    for word in words:
+        if word in _CODE_EXPANSIONS:
+            expanded.extend(_CODE_EXPANSIONS[word].split())
+        expanded.append(word)
+    return expanded
+
+@lru_cache(maxsize=8192)
+def _preprocess_query(query: str,
+                      expand_case: bool = True,
+                      expand_abbreviations: bool = True,
+                      apply_stemming: bool = True,
+                      remove_stop_words: bool = False,
+                      min_word_length: int = 2) -> str:
+    """Memoized preprocessing pipeline, see CodeQueryPreprocessor.preprocess_query"""
+    if not query or not query.strip():
+        return ""
+
+    # Normalize unicode characters
+    query = unicodedata.normalize('NFKD', query)
+
+    # Extract words, punctuation never belongs to a word run so no separate stripping pass is needed.
+    # Case is kept until after camelCase detection, words are lowercased as they are emitted
+    words = [word for word in _WORD_RE.findall(query) if len(word) >= min_word_length]
+
+    # Process each word, dropping short fragments as they are produced
+    processed_words = []
+
+    for word in words:
+        # Skip if it's just numbers (unless it's a version number context)
+        if _NUMBER_RE.fullmatch(word):
+            processed_words.append(word)  # Keep numbers as they might be important
+            continue
+    
+        # Expand case conventions
+        if expand_case:
+            # Handle camelCase
+            tail = word[1:]
+            if tail != tail.lower():  # Has uppercase after first char
+                expanded = _expand_camel_case(word)
+                processed_words.extend(part for part in expanded.split() if len(part) >= min_word_length)
+        
+            # Handle snake_case and kebab-case
+            if '_' in word or '-' in word:
+                expanded = _expand_snake_kebab(word)
+                processed_words.extend(part for part in expanded.split() if len(part) >= min_word_length)
+    
+        # Add original word
+        processed_words.append(word.lower())
+
+    # Expand abbreviations
+    if expand_abbreviations:
+        processed_words = _expand_abbreviations(processed_words)
+
+    # Apply stemming
+    if apply_stemming:
+        processed_words = [_simple_stem(word) for word in processed_words]
+
+    # Remove stop words (usually not recommended for code search)
+    if remove_stop_words:
+        processed_words = [word for word in processed_words 
+                          if word not in _STOP_WORDS]
+
+    # Deduplicate once, preserving first occurrence; stemming can shorten words
+    # so the length check is repeated here
+    return ' '.join(word for word in dict.fromkeys(processed_words) if len(word) >= min_word_length)
+
+@lru_cache(maxsize=8192)
+def _generate_query_variations(query: str) -> Tuple[str, ...]:
+    """Memoized variations generator, see CodeQueryPreprocessor.generate_query_variations"""
+    variations = []
+
+    # Original query
+    variations.append(query)
+
+    # Preprocessed with different settings
+    variations.append(_preprocess_query(query, 
+                                          expand_case=True, 
+                                          expand_abbreviations=True, 
+                                          apply_stemming=False))
+
+    variations.append(_preprocess_query(query, 
+                                          expand_case=True, 
+                                          expand_abbreviations=False, 
+                                          apply_stemming=True))
+
+    variations.append(_preprocess_query(query, 
+                                          expand_case=False, 
+                                          expand_abbreviations=True, 
+                                          apply_stemming=True))
+
+    # Remove empty and duplicate variations
+    return tuple(filter(None, dict.fromkeys(variations)))
+
 
 class CodeQueryPreprocessor:
     """
     Blazingly fast query preprocessor optimized for code search.
     Handles camelCase, snake_case, kebab-case, stemming, and code-specific terms.
+    The processing pipeline is stateless and memoized at module level, so repeated
+    queries are answered from cache regardless of which instance processes them.
     """
     
-    def __init__(self):
-        # Compile regex patterns once for maximum performance
-        self._camel_case_pattern = re.compile(r'([a-z])([A-Z])')
-        self._snake_kebab_pattern = re.compile(r'[_\-]+')
-        self._word_boundary_pattern = re.compile(r'\b\w+\b')
-        self._non_alphanumeric = re.compile(r'[^\w\s]')
-        self._multiple_spaces = re.compile(r'\s+')
-        self._number_pattern = re.compile(r'\d+')
-        
-        # Common code abbreviations and their expansions (cached for speed)
-        self._code_expansions = {
-            'btn': 'button',
-            'cfg': 'config configuration',
-            'ctx': 'context',
-            'db': 'database',
-            'fn': 'function',
-            'func': 'function',
-            'impl': 'implementation implement',
-            'mgr': 'manager',
-            'obj': 'object',
-            'param': 'parameter',
-            'proc': 'process processor',
-            'repo': 'repository',
-            'req': 'request require',
-            'res': 'response result',
-            'str': 'string',
-            'temp': 'temporary template',
-            'util': 'utility utilities',
-            'val': 'value',
-            'var': 'variable',
-            'auth': 'authentication authorize',
-            'admin': 'administrator administration',
-            'api': 'application programming interface',
-            'ui': 'user interface',
-            'url': 'uniform resource locator link',
-            'http': 'hypertext transfer protocol',
-            'json': 'javascript object notation',
-            'xml': 'extensible markup language',
-            'sql': 'structured query language',
-            'css': 'cascading style sheets',
-            'html': 'hypertext markup language',
-            'js': 'javascript',
-            'py': 'python',
-            'ts': 'typescript',
-            'async': 'asynchronous',
-            'sync': 'synchronous',
-        }
-        
-        # Simple stemming rules for common programming terms
-        self._stem_rules = [
-            (r'ies$', 'y'),      # utilities -> utility
-            (r'ied$', 'y'),      # applied -> apply
-            (r'ying$', 'y'),     # applying -> apply
-            (r'ing$', ''),       # processing -> process
-            (r'ed$', ''),        # processed -> process
-            (r'er$', ''),        # processor -> process
-            (r'est$', ''),       # fastest -> fast
-            (r's$', ''),         # functions -> function
-        ]
-        self._compiled_stem_rules = [(re.compile(pattern), replacement) 
-                                   for pattern, replacement in self._stem_rules]
-        
-        # Stop words for code (less aggressive than natural language)
-        self._stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 
-            'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 
-            'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would',
-            'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it',
-            'we', 'they', 'me', 'him', 'her', 'us', 'them'
-        }
-    
-    @lru_cache(maxsize=1000)
-    def _expand_camel_case(self, word: str) -> str:
-        """Convert camelCase to space-separated words with caching"""
-        # Handle camelCase: getUserName -> get User Name
-        expanded = self._camel_case_pattern.sub(r'\1 \2', word)
-        return expanded.lower()
-    
-    @lru_cache(maxsize=1000)
-    def _expand_snake_kebab(self, word: str) -> str:
-        """Convert snake_case and kebab-case to space-separated with caching"""
-        # Handle snake_case and kebab-case: get_user_name -> get user name
-        return self._snake_kebab_pattern.sub(' ', word).lower()
-    
-    @lru_cache(maxsize=500)
-    def _simple_stem(self, word: str) -> str:
-        """Apply simple stemming rules with caching"""
-        if len(word) <= 3:  # Don't stem very short words
-            return word
-            
-        for pattern, replacement in self._compiled_stem_rules:
-            if pattern.search(word):
-                stemmed = pattern.sub(replacement, word)
-                if len(stemmed) >= 2:  # Don't create words that are too short
-                    return stemmed
-        return word
-    
-    def _expand_abbreviations(self, words: List[str]) -> List[str]:
-        """Expand common code abbreviations"""
-        expanded = []
-        for word in words:
-            if word in self._code_expansions:
-                expanded.extend(self._code_expansions[word].split())
-            expanded.append(word)
-        return expanded
+    _code_expansions = _CODE_EXPANSIONS
+    _stop_words = _STOP_WORDS
+    _expand_camel_case = staticmethod(_expand_camel_case)
+    _expand_snake_kebab = staticmethod(_expand_snake_kebab)
+    _simple_stem = staticmethod(_simple_stem)
+    _expand_abbreviations = staticmethod(_expand_abbreviations)
     
     def preprocess_query(self, query: str, 
                         expand_case: bool = True,
@@ -137,101 +238,18 @@ class CodeQueryPreprocessor:
         Returns:
             Preprocessed query string
         """
-        if not query or not query.strip():
-            return ""
-        
-        # Normalize unicode characters
-        query = unicodedata.normalize('NFKD', query)
-        
-        # Remove excessive punctuation but keep some code-relevant chars
-        query = self._non_alphanumeric.sub(' ', query)
-        
-        # Extract words
-        words = self._word_boundary_pattern.findall(query.lower())
-        
-        # Process each word
-        processed_words = []
-        
-        for word in words:
-            if len(word) < min_word_length:
-                continue
-                
-            # Skip if it's just numbers (unless it's a version number context)
-            if self._number_pattern.fullmatch(word):
-                processed_words.append(word)  # Keep numbers as they might be important
-                continue
-            
-            # Expand case conventions
-            if expand_case:
-                # Handle camelCase
-                if any(c.isupper() for c in word[1:]):  # Has uppercase after first char
-                    expanded = self._expand_camel_case(word)
-                    processed_words.extend(expanded.split())
-                
-                # Handle snake_case and kebab-case
-                if '_' in word or '-' in word:
-                    expanded = self._expand_snake_kebab(word)
-                    processed_words.extend(expanded.split())
-            
-            # Add original word
-            processed_words.append(word)
-        
-        # Remove duplicates while preserving order
-        unique_words = []
-        seen = set()
-        for word in processed_words:
-            if word not in seen and len(word) >= min_word_length:
-                unique_words.append(word)
-                seen.add(word)
-        
-        # Expand abbreviations
-        if expand_abbreviations:
-            unique_words = self._expand_abbreviations(unique_words)
-        
-        # Apply stemming
-        if apply_stemming:
-            unique_words = [self._simple_stem(word) for word in unique_words]
-        
-        # Remove stop words (usually not recommended for code search)
-        if remove_stop_words:
-            unique_words = [word for word in unique_words 
-                          if word not in self._stop_words]
-        
-        # Final cleanup and deduplication
-        final_words = []
-        seen = set()
-        for word in unique_words:
-            if word and len(word) >= min_word_length and word not in seen:
-                final_words.append(word)
-                seen.add(word)
-        
-        return ' '.join(final_words)
+        return _preprocess_query(
+            query,
+            expand_case,
+            expand_abbreviations,
+            apply_stemming,
+            remove_stop_words,
+            min_word_length
+        )
     
     def generate_query_variations(self, query: str) -> List[str]:
         """Generate multiple query variations for better search coverage"""
-        variations = []
-        
-        # Original query
-        variations.append(query)
-        
-        # Preprocessed with different settings
-        variations.append(self.preprocess_query(query, 
-                                              expand_case=True, 
-                                              expand_abbreviations=True, 
-                                              apply_stemming=False))
-        
-        variations.append(self.preprocess_query(query, 
-                                              expand_case=True, 
-                                              expand_abbreviations=False, 
-                                              apply_stemming=True))
-        
-        variations.append(self.preprocess_query(query, 
-                                              expand_case=False, 
-                                              expand_abbreviations=True, 
-                                              apply_stemming=True))
-        
-        # Remove empty and duplicate variations
-        return list(filter(None, list(dict.fromkeys(variations))))
+        return list(_generate_query_variations(query))
     
 if __name__ == "__main__":        
     # Test the preprocessor